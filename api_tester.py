@@ -1,18 +1,19 @@
 import streamlit as st
 import requests
-import json
 import time
-from typing import List, Dict
-from json_repair import repair_json
+from typing import List, Dict, Optional
+from response_parser import parse_json, validate_cases
+from llm_router import get_router
 import os
 # 配置DeepSeek-R1 API参数
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
-DEEPSEEK_API_URL = "https://api.lkeap.cloud.tencent.com/v1"
 DEFAULT_HEADERS = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
 }
 
+TEST_CASE_FIELDS = ["name", "method", "path", "assertions"]
+
 class DeepSeekTestGenerator:
     """基于DeepSeek-R1的测试用例生成引擎"""
     def __init__(self):
@@ -43,25 +44,29 @@ class DeepSeekTestGenerator:
 ```"""
 
     def generate_tests(self, api_desc: str) -> dict:
-        """调用DeepSeek-R1生成测试用例"""
-        payload = {
-            "model": "deepseek-r1",
-            "messages": [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": api_desc}
-            ],
-            "temperature": 0.3,
-            "response_format": {"type": "json_object"}
-        }
-        
-        response = requests.post(
-            DEEPSEEK_API_URL,
-            headers=DEFAULT_HEADERS,
-            json=payload,
-            verify=False
+        """调用模型路由器生成测试用例（短描述优先走快速模型，校验失败回退DeepSeek-R1）"""
+        suite = get_router().complete(
+            self.system_prompt, api_desc,
+            validate=self.parse_suite,
+            fast_validate=lambda content: self.parse_suite(content, strict=True),
+            temperature=0.3,
+            response_format={"type": "json_object"}
         )
-        print(response.json())
-        return json.loads(repair_json(response.json()["choices"][0]["message"]["content"]))
+        return suite or {"openapi": "3.0.0", "test_cases": []}
+
+    @staticmethod
+    def parse_suite(content: str, strict: bool = False) -> Optional[dict]:
+        """解析测试套件，没有合法用例（strict时有任何不合规用例）返回None"""
+        suite = parse_json(content, expect=dict)
+        if isinstance(suite, list):  # 整体结构损坏时只抢救出了用例对象
+            suite = {"openapi": "3.0.0", "test_cases": suite}
+        if not suite:
+            return None
+        suite.setdefault("openapi", "3.0.0")  # 只返回用例数组时补齐规范版本
+        suite["test_cases"], rejected = validate_cases(suite.get("test_cases", []), TEST_CASE_FIELDS, id_field=None)
+        if not suite["test_cases"] or (strict and rejected):
+            return None
+        return suite
 
 class TestExecutor:
     """支持强化学习的测试执行引擎"""
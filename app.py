@@ -1,17 +1,12 @@
-import os
 import json
-import requests
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
+from response_parser import parse_cases, strict_case_validator, PARSE_STATS
+from llm_router import get_router
 load_dotenv()
 
 def generate_test_cases(prompt, max_cases, temp):
-    headers = {
-        "Authorization": f"Bearer {os.getenv('DEEPSEEK_API_KEY')}",
-        "Content-Type": "application/json"
-    }
-    
     system_prompt = f"""作为资深测试工程师，请生成{max_cases}条测试用例，严格遵循以下要求：
 1. 输出格式为JSON数组，每个对象包含字段：
    - 用例编号（格式TC-模块-序号，如TC-LOGIN-01）
@@ -22,50 +17,33 @@ def generate_test_cases(prompt, max_cases, temp):
 3. 按优先级从高到低排序"""
 
     try:
-        response = requests.post(
-            "https://api.lkeap.cloud.tencent.com/v1",
-            headers=headers,
-            json={
-                "model": "deepseek-r1",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": temp,
-                "response_format": {"type": "json_object"}  # 要求返回JSON格式
-            },
-            verify=False
+        result = get_router().complete(
+            system_prompt, prompt,
+            validate=parse_cases,
+            fast_validate=strict_case_validator(max_cases),
+            temperature=temp,
+            response_format={"type": "json_object"}  # 要求返回JSON格式
         )
-        response.raise_for_status()
         
-        return parse_response(response.json())
+        return parse_response(result)
     except Exception as e:
         st.error(f"API调用失败: {str(e)}")
         return []
 
-def parse_response(response_data):
-    """解析API返回的JSON数据"""
+def parse_response(result):
+    """处理路由器返回的解析结果"""
     try:
-        # 提取并验证JSON结构
-        content = response_data["choices"][0]["message"]["content"]
-        cases = json.loads(content)
-        
-        # 类型检查
-        if not isinstance(cases, list):
-            raise ValueError("响应不是JSON数组")
+        # 所有模型的响应都没有解析出合法用例
+        if result is None:
+            st.error("响应不是有效的JSON格式")
+            return []
             
-        # 字段验证
-        required_fields = ["用例编号", "步骤", "预期", "优先级"]
-        for idx, case in enumerate(cases):
-            if not all(field in case for field in required_fields):
-                raise ValueError(f"第{idx+1}条用例字段缺失")
-            if not case["用例编号"].startswith("TC-"):
-                raise ValueError(f"编号格式错误: {case['用例编号']}")
+        # 字段验证：只丢弃不合规的用例，保留其余结果
+        cases, rejected = result
+        if rejected:
+            st.warning(f"已丢弃{len(rejected)}条不合规用例：{'；'.join(rejected[:3])}")
                 
         return cases
-    except json.JSONDecodeError:
-        st.error("响应不是有效的JSON格式")
-        return []
     except Exception as e:
         st.error(f"解析失败: {str(e)}")
         return []
@@ -101,6 +79,21 @@ def main():
                             help="建议优先生成核心用例，再补充扩展用例")
         temperature = st.slider("生成温度", 0.1, 1.0, 0.7,
                               help="值越高生成结果越多样，但可能降低准确性")
+        
+        with st.expander("📈 解析统计"):
+            stats = PARSE_STATS.snapshot()
+            st.metric("平均解析耗时", f"{stats['avg_parse_ms']:.2f}ms")
+            st.metric("用例丢弃率", f"{stats['discard_rate']:.1%}")
+            st.metric("响应解析失败率", f"{stats['failed_rate']:.1%}")
+            st.caption(f"响应 {stats['responses']} 次：快速 {stats['modes']['fast']} / 修复 {stats['modes']['repair']} / "
+                       f"抢救 {stats['modes']['salvage']} / 失败 {stats['modes']['failed']}")
+        
+        with st.expander("🔀 模型路由"):
+            for model, model_stats in get_router().snapshot().items():
+                p50, p90 = model_stats["p50_ms"], model_stats["p90_ms"]
+                st.caption(f"**{model}**：请求 {model_stats['requests']} 次，错误率 {model_stats['error_rate']:.1%}，"
+                           f"校验失败 {model_stats['invalid']} 次，对冲 {model_stats['hedges']} 次，"
+                           f"p50 {f'{p50:.0f}ms' if p50 is not None else '-'} / p90 {f'{p90:.0f}ms' if p90 is not None else '-'}")
     
     # 主界面
     st.title("🧪 智能测试用例生成系统")
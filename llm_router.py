@@ -0,0 +1,251 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from typing import Any, Callable, Dict, List, Optional
+import requests
+
+DEFAULT_API_URL = "https://api.lkeap.cloud.tencent.com/v1"
+DEFAULT_FAST_MODEL = "deepseek-v3"
+DEFAULT_REASONING_MODEL = "deepseek-r1"
+
+
+class ModelStats:
+    """单个模型的实时延迟/错误统计（滑动窗口）"""
+    def __init__(self, window: int = 200, min_samples: int = 5):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.requests = 0
+        self.errors = 0
+        self.invalid = 0
+        self.hedges = 0
+
+    def record(self, latency_ms: float, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            else:
+                self.latencies.append(latency_ms)
+
+    def record_invalid(self):
+        with self._lock:
+            self.invalid += 1
+
+    def record_hedge(self):
+        with self._lock:
+            self.hedges += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """返回延迟分位数（毫秒），样本不足时返回None"""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        p50, p90 = self.percentile(0.5), self.percentile(0.9)
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "error_rate": self.errors / self.requests if self.requests else 0.0,
+                "invalid": self.invalid,
+                "hedges": self.hedges,
+                "p50_ms": p50,
+                "p90_ms": p90,
+            }
+
+
+class LLMRouter:
+    """按需求复杂度路由模型，并对慢请求发起对冲请求
+
+    简单/短需求先走快速的非推理模型，校验失败再回退到R1；
+    某个模型的请求开始执行后超过其实测p90延迟仍未返回时，再发出一个备份请求，取最先通过校验的结果。
+    对冲请求使用独立的线程池，并限制每个模型同时在途的对冲数；主线程池繁忙时不对冲，避免负载自我放大。
+    """
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None,
+                 fast_model: Optional[str] = None, reasoning_model: Optional[str] = None,
+                 simple_max_chars: int = 200, simple_max_lines: int = 5,
+                 hedge: bool = True, hedge_quantile: float = 0.9,
+                 timeout: float = 300, max_workers: int = 8,
+                 max_hedge_workers: int = 4, max_hedges_per_model: int = 2):
+        self.api_url = (api_url or os.getenv("DEEPSEEK_API_URL", DEFAULT_API_URL)).rstrip("/")
+        self.api_key = api_key
+        self.fast_model = fast_model if fast_model is not None else os.getenv("DEEPSEEK_FAST_MODEL", DEFAULT_FAST_MODEL)
+        self.reasoning_model = reasoning_model or os.getenv("DEEPSEEK_REASONING_MODEL", DEFAULT_REASONING_MODEL)
+        self.simple_max_chars = simple_max_chars
+        self.simple_max_lines = simple_max_lines
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.max_hedge_workers = max_hedge_workers
+        self.max_hedges_per_model = max_hedges_per_model
+        self.stats: Dict[str, ModelStats] = {}
+        self._stats_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_hedge_workers, thread_name_prefix="llm-router-hedge")
+        self._load_lock = threading.Lock()
+        self._pending = 0  # 主线程池中排队+执行中的请求数
+        self._hedges_in_flight: Dict[str, int] = {}
+
+    def model_stats(self, model: str) -> ModelStats:
+        with self._stats_lock:
+            if model not in self.stats:
+                self.stats[model] = ModelStats()
+            return self.stats[model]
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._stats_lock:
+            models = list(self.stats.items())
+        return {model: stats.snapshot() for model, stats in models}
+
+    def is_simple(self, prompt: str) -> bool:
+        prompt = prompt.strip()
+        return len(prompt) <= self.simple_max_chars and prompt.count("\n") < self.simple_max_lines
+
+    def route(self, prompt: str) -> List[str]:
+        """返回依次尝试的模型列表"""
+        if self.fast_model and self.fast_model != self.reasoning_model and self.is_simple(prompt):
+            return [self.fast_model, self.reasoning_model]
+        return [self.reasoning_model]
+
+    def _call(self, model: str, messages: List[dict], params: dict) -> str:
+        stats = self.model_stats(model)
+        start = time.perf_counter()
+        try:
+            response = requests.post(
+                f"{self.api_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key or os.getenv('DEEPSEEK_API_KEY')}",
+                    "Content-Type": "application/json"
+                },
+                json={"model": model, "messages": messages, **params},
+                timeout=self.timeout,
+                verify=False
+            )
+            response.raise_for_status()
+            content = response.json()["choices"][0]["message"]["content"]
+        except Exception:
+            stats.record((time.perf_counter() - start) * 1000, error=True)
+            raise
+        stats.record((time.perf_counter() - start) * 1000)
+        return content
+
+    def _call_and_validate(self, model: str, messages: List[dict], params: dict,
+                           validate: Optional[Callable[[str], Any]]) -> Any:
+        content = self._call(model, messages, params)
+        if validate is None:
+            return content
+        result = validate(content)
+        if result is None:
+            self.model_stats(model).record_invalid()
+        return result
+
+    def _submit_primary(self, started: threading.Event, model: str, messages: List[dict], params: dict,
+                        validate: Optional[Callable[[str], Any]]):
+        with self._load_lock:
+            self._pending += 1
+        return self._pool.submit(self._run_primary, started, model, messages, params, validate)
+
+    def _run_primary(self, started: threading.Event, model: str, messages: List[dict], params: dict,
+                     validate: Optional[Callable[[str], Any]]) -> Any:
+        started.set()
+        try:
+            return self._call_and_validate(model, messages, params, validate)
+        finally:
+            with self._load_lock:
+                self._pending -= 1
+
+    def _reserve_hedge(self, model: str) -> bool:
+        """主线程池繁忙或对冲数已达上限时不再对冲"""
+        with self._load_lock:
+            if self._pending >= self.max_workers:
+                return False
+            if sum(self._hedges_in_flight.values()) >= self.max_hedge_workers:
+                return False
+            if self._hedges_in_flight.get(model, 0) >= self.max_hedges_per_model:
+                return False
+            self._hedges_in_flight[model] = self._hedges_in_flight.get(model, 0) + 1
+            return True
+
+    def _run_hedge(self, model: str, messages: List[dict], params: dict,
+                   validate: Optional[Callable[[str], Any]]) -> Any:
+        try:
+            return self._call_and_validate(model, messages, params, validate)
+        finally:
+            with self._load_lock:
+                self._hedges_in_flight[model] -= 1
+
+    def _attempt(self, model: str, messages: List[dict], params: dict,
+                 validate: Optional[Callable[[str], Any]]) -> Any:
+        """对单个模型发起（可能对冲的）请求，返回首个通过校验的结果"""
+        started = threading.Event()
+        futures = [self._submit_primary(started, model, messages, params, validate)]
+        delay_ms = self.model_stats(model).percentile(self.hedge_quantile) if self.hedge else None
+        if delay_ms is not None:
+            started.wait()  # p90计时从请求真正开始执行算起，排队时间不计入
+            done, _ = wait(futures, timeout=delay_ms / 1000, return_when=FIRST_COMPLETED)
+            if not done and self._reserve_hedge(model):
+                self.model_stats(model).record_hedge()
+                futures.append(self._hedge_pool.submit(self._run_hedge, model, messages, params, validate))
+
+        last_error = None
+        succeeded = False
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            succeeded = True
+            if result is not None:
+                return result
+        if not succeeded and last_error is not None:
+            raise last_error
+        return None
+
+    def complete(self, system_prompt: str, user_prompt: str,
+                 validate: Optional[Callable[[str], Any]] = None,
+                 fast_validate: Optional[Callable[[str], Any]] = None, **params) -> Any:
+        """生成并校验结果
+
+        validate接收模型返回的文本，返回解析后的结果；返回None表示校验失败，将回退到下一个模型。
+        fast_validate用于回退前的快速模型（默认同validate），可设置更严格的标准，如用例数量不足即回退。
+        所有模型都校验失败时返回None；最后一个模型请求出错时抛出异常。
+        """
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        models = self.route(user_prompt)
+        for model in models:
+            last_error = None
+            model_validate = validate if model == models[-1] else (fast_validate or validate)
+            try:
+                result = self._attempt(model, messages, params, model_validate)
+            except Exception as e:
+                last_error = e
+                continue
+            if result is not None:
+                return result
+        if last_error is not None:
+            raise last_error
+        return None
+
+
+_ROUTER = None
+_ROUTER_LOCK = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """进程内共享的路由器，使各页面共用同一份模型统计"""
+    global _ROUTER
+    with _ROUTER_LOCK:
+        if _ROUTER is None:
+            _ROUTER = LLMRouter()
+        return _ROUTER
@@ -1,16 +1,33 @@
 import os
-import json
 import pandas as pd
 import streamlit as st
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import requests
-from json_repair import repair_json
+from response_parser import parse_json, parse_cases, strict_case_validator, PARSE_STATS, HISTORY_PARSE_STATS
+from llm_router import get_router
 import PyPDF2
 import uuid
 import re
 from datetime import datetime
 
+def _safe_parse_json(json_str):
+    if pd.isna(json_str):
+        return []
+    cases = parse_json(json_str, stats=HISTORY_PARSE_STATS)
+    if cases is None:
+        print(f"JSON解析错误, 数据: {str(json_str)[:100]}...")
+        return []
+    return cases
+
+@st.cache_data
+def _read_history_cases(csv_path, mtime):
+    # mtime参与缓存键：文件未变化时rerun不重复解析，解析统计只反映最近一次加载
+    HISTORY_PARSE_STATS.reset()
+    df = pd.read_csv(csv_path)
+    if '测试用例' in df.columns:
+        df['测试用例'] = df['测试用例'].apply(_safe_parse_json)
+    return df
+
 def load_cases(csv_path="test_cases.csv"):
     try:
         if not os.path.exists(csv_path):
@@ -19,23 +36,12 @@ def load_cases(csv_path="test_cases.csv"):
                 f.write("需求描述,测试用例\n")
             return pd.DataFrame(columns=['需求描述', '测试用例'])
             
-        df = pd.read_csv(csv_path)
+        df = _read_history_cases(csv_path, os.path.getmtime(csv_path))
         
         if '需求描述' not in df.columns or '测试用例' not in df.columns:
             st.warning(f"CSV文件缺少必要的列（需要'需求描述'和'测试用例'列）。请检查文件格式。")
             return pd.DataFrame(columns=['需求描述', '测试用例'])
         
-        def safe_parse_json(json_str):
-            if pd.isna(json_str):
-                return []
-            try:
-                cleaned_str = str(json_str).replace("'", "\"").strip()
-                return json.loads(repair_json(cleaned_str))
-            except Exception as e:
-                print(f"JSON解析错误: {e}, 数据: {json_str[:100]}...")
-                return []
-        
-        df['测试用例'] = df['测试用例'].apply(safe_parse_json)
         return df
         
     except Exception as e:
@@ -48,15 +54,97 @@ def load_cases(csv_path="test_cases.csv"):
             pass
         return pd.DataFrame(columns=['需求描述', '测试用例'])
 
-def load_knowledge_segments(csv_path="knowledge_segments.csv"):
-    try:
-        if os.path.exists(csv_path):
-            return pd.read_csv(csv_path)
-        else:
-            return pd.DataFrame(columns=['segment_id', 'document_name', 'page_num', 'content'])
-    except Exception as e:
-        st.error(f"知识库加载失败：{str(e)}")
-        return pd.DataFrame(columns=['segment_id', 'document_name', 'page_num', 'content'])
+KNOWLEDGE_DIR = "knowledge_base"
+DEFAULT_NAMESPACE = "default"
+LEGACY_KNOWLEDGE_CSV = "knowledge_segments.csv"
+KNOWLEDGE_COLUMNS = ['segment_id', 'document_name', 'page_num', 'content']
+
+def normalize_namespace(namespace):
+    namespace = re.sub(r'[^\w\-]+', '_', str(namespace or "").strip()).strip('_')
+    return namespace or DEFAULT_NAMESPACE
+
+def namespace_path(namespace):
+    return os.path.join(KNOWLEDGE_DIR, f"{normalize_namespace(namespace)}.csv")
+
+def migrate_legacy_knowledge():
+    # 旧版本所有文档都写入同一个knowledge_segments.csv，首次运行时迁移为default命名空间分片
+    default_path = namespace_path(DEFAULT_NAMESPACE)
+    if os.path.exists(LEGACY_KNOWLEDGE_CSV) and not os.path.exists(default_path):
+        os.makedirs(KNOWLEDGE_DIR, exist_ok=True)
+        os.replace(LEGACY_KNOWLEDGE_CSV, default_path)
+
+def list_namespaces():
+    if not os.path.isdir(KNOWLEDGE_DIR):
+        return []
+    return sorted(name[:-4] for name in os.listdir(KNOWLEDGE_DIR) if name.endswith(".csv"))
+
+def load_knowledge_segments(namespaces=None):
+    if namespaces is None:
+        namespaces = list_namespaces()
+    elif isinstance(namespaces, str):
+        namespaces = [namespaces]
+    
+    frames = []
+    for namespace in namespaces:
+        csv_path = namespace_path(namespace)
+        try:
+            if os.path.exists(csv_path):
+                df = pd.read_csv(csv_path)
+                df['namespace'] = normalize_namespace(namespace)
+                frames.append(df)
+        except Exception as e:
+            st.error(f"知识库[{namespace}]加载失败：{str(e)}")
+    
+    if not frames:
+        return pd.DataFrame(columns=KNOWLEDGE_COLUMNS + ['namespace'])
+    return pd.concat(frames, ignore_index=True)
+
+@st.cache_resource
+def _knowledge_index_cache():
+    # 跨会话、跨rerun共享的分片索引：namespace -> {mtime, df, vectorizer, matrix}
+    return {}
+
+def build_knowledge_index(namespace):
+    namespace = normalize_namespace(namespace)
+    csv_path = namespace_path(namespace)
+    cache = _knowledge_index_cache()
+    
+    if not os.path.exists(csv_path):
+        cache.pop(namespace, None)
+        return None
+    
+    mtime = os.path.getmtime(csv_path)
+    index = cache.get(namespace)
+    if index is not None and index['mtime'] == mtime:
+        return index
+    
+    df = pd.read_csv(csv_path)
+    df = df[df['content'].notna()].reset_index(drop=True)
+    if df.empty:
+        cache.pop(namespace, None)
+        return None
+    
+    vectorizer = TfidfVectorizer()
+    matrix = vectorizer.fit_transform(df['content'].astype(str).tolist())
+    index = {'mtime': mtime, 'df': df, 'vectorizer': vectorizer, 'matrix': matrix}
+    cache[namespace] = index
+    return index
+
+def warm_knowledge_index(namespaces=None):
+    if namespaces is None:
+        namespaces = list_namespaces()
+    return [ns for ns in namespaces if build_knowledge_index(ns) is not None]
+
+def evict_knowledge_index(namespaces=None):
+    cache = _knowledge_index_cache()
+    if namespaces is None:
+        cache.clear()
+        return
+    for namespace in namespaces:
+        cache.pop(normalize_namespace(namespace), None)
+
+def loaded_namespaces():
+    return sorted(_knowledge_index_cache().keys())
 
 def process_pdf(uploaded_file):
     filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.pdf"
@@ -94,7 +182,9 @@ def process_pdf(uploaded_file):
             os.remove(filepath)
         return [], 0, 0
 
-def save_knowledge_segments(segments, csv_path="knowledge_segments.csv"):
+def save_knowledge_segments(segments, namespace=DEFAULT_NAMESPACE):
+    csv_path = namespace_path(namespace)
+    os.makedirs(KNOWLEDGE_DIR, exist_ok=True)
     df_new = pd.DataFrame(segments)
     
     if os.path.exists(csv_path):
@@ -104,6 +194,7 @@ def save_knowledge_segments(segments, csv_path="knowledge_segments.csv"):
         df_combined = df_new
     
     df_combined.to_csv(csv_path, index=False)
+    evict_knowledge_index([namespace])
     return len(df_combined)
 
 def find_similar_cases(new_req, df, top_k=3):
@@ -115,34 +206,37 @@ def find_similar_cases(new_req, df, top_k=3):
     top_indices = similarity.argsort()[0][-top_k:][::-1]
     return [df.iloc[i]['测试用例'] for i in top_indices]
 
-def find_relevant_knowledge(query, knowledge_df, top_k=3):
-    if knowledge_df.empty:
-        return []
+def find_relevant_knowledge(query, namespaces=None, top_k=3):
+    if namespaces is None:
+        namespaces = list_namespaces()
     
-    vectorizer = TfidfVectorizer()
-    documents = knowledge_df['content'].tolist()
-    try:
-        tfidf_matrix = vectorizer.fit_transform(documents + [query])
-        similarity = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1])
-        top_indices = similarity.argsort()[0][-top_k:][::-1]
-        
-        results = []
-        for idx in top_indices:
-            segment = knowledge_df.iloc[idx]
-            results.append({
-                'document': segment['document_name'],
-                'page': segment['page_num'],
-                'content': segment['content']
-            })
-        return results
-    except Exception as e:
-        st.error(f"知识搜索失败：{str(e)}")
-        return []
+    candidates = []
+    for namespace in namespaces:
+        # 单个分片损坏（缺列、空词表等）只跳过该分片，不影响其他命名空间
+        try:
+            index = build_knowledge_index(namespace)
+            if index is None:
+                continue
+            similarity = cosine_similarity(index['vectorizer'].transform([query]), index['matrix'])[0]
+            for idx in similarity.argsort()[-top_k:][::-1]:
+                if similarity[idx] <= 0:  # 与查询无任何相关词的段落不占用提示词名额
+                    break
+                candidates.append((similarity[idx], normalize_namespace(namespace), index['df'].iloc[idx]))
+        except Exception as e:
+            st.error(f"知识库[{namespace}]搜索失败：{str(e)}")
+    
+    candidates.sort(key=lambda item: item[0], reverse=True)
+    results = []
+    for score, namespace, segment in candidates[:top_k]:
+        results.append({
+            'namespace': namespace,
+            'document': segment['document_name'],
+            'page': segment['page_num'],
+            'content': segment['content']
+        })
+    return results
 
 def generate_test_cases(prompt, history_cases=None, knowledge_segments=None, max_cases=10, temp=0.7, use_enhancement=True):
-    headers = {"Authorization": "Bearer sk-xxxxxx", 
-               "Content-Type": "application/json"}
-    
     system_prompt = ""
     
     if use_enhancement and (history_cases or knowledge_segments):
@@ -183,22 +277,15 @@ def generate_test_cases(prompt, history_cases=None, knowledge_segments=None, max
 4. 仅返回合法JSON，不要额外解释"""
     
     try:
-        response = requests.post(
-            "https://api.lkeap.cloud.tencent.com/v1",
-            headers=headers,
-            json={
-                "model": "deepseek-r1",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": temp
-            },
-            verify=False
-        )
-        content = response.json()["choices"][0]["message"]["content"]
-        print(content)
-        return json.loads(repair_json(content))
+        result = get_router().complete(system_prompt, prompt, validate=parse_cases,
+                                      fast_validate=strict_case_validator(max_cases), temperature=temp)
+        if result is None:
+            st.error("AI返回的内容中没有合法的测试用例，请调整需求描述后重试")
+            return []
+        cases, rejected = result
+        if rejected:
+            st.warning(f"已丢弃{len(rejected)}条不合规用例：{'；'.join(rejected[:3])}")
+        return cases
     except Exception as e:
         st.error(f"AI罢工了：{str(e)}（检查API_KEY是不是充话费送的？）")
         return []
@@ -276,12 +363,8 @@ def main():
     st.title("💡 AI测试用例生成器（内置知识库增强版）")
     st.markdown("<p style='color:#4B5563;'>上传专业文档，设计出更专业的测试用例</p>", unsafe_allow_html=True)
     
-    if 'knowledge_segments_count' not in st.session_state:
-        st.session_state.knowledge_segments_count = 0
-        
-    knowledge_df = load_knowledge_segments()
-    if not knowledge_df.empty:
-        st.session_state.knowledge_segments_count = len(knowledge_df)
+    migrate_legacy_knowledge()
+    namespaces = list_namespaces()
     
     test_cases_df = load_cases()
     
@@ -302,18 +385,31 @@ def main():
                     submitted = st.form_submit_button("✨ 生成测试用例", use_container_width=True)
                 with col_button2:
                     use_knowledge = st.checkbox("使用知识库增强", value=True, help="勾选后将使用知识库和历史用例增强测试用例生成")
+                
+                selected_namespaces = st.multiselect("检索的知识库命名空间", namespaces, default=namespaces,
+                                                     help="仅加载并检索选中的知识库分片")
         
         with col2:
             st.markdown("<h3>知识库状态</h3>", unsafe_allow_html=True)
             
+            loaded = loaded_namespaces()
             st.markdown(f"""
             <div class="info-box">
                 <p><b>📊 知识库统计</b></p>
-                <p>• 文档段落：{st.session_state.knowledge_segments_count} 条</p>
+                <p>• 命名空间：{len(namespaces)} 个</p>
+                <p>• 已加载分片：{"、".join(loaded) if loaded else "无"}</p>
                 <p>• 历史用例：{len(test_cases_df)} 条</p>
             </div>
             """, unsafe_allow_html=True)
             
+            with st.expander("📈 解析统计"):
+                for label, parse_stats in (("AI响应", PARSE_STATS), ("历史用例", HISTORY_PARSE_STATS)):
+                    stats = parse_stats.snapshot()
+                    st.caption(f"**{label}**：解析 {stats['responses']} 次，平均 {stats['avg_parse_ms']:.2f}ms，"
+                               f"失败率 {stats['failed_rate']:.1%}，用例丢弃率 {stats['discard_rate']:.1%}，"
+                               f"快速 {stats['modes']['fast']} / 修复 {stats['modes']['repair']} / "
+                               f"抢救 {stats['modes']['salvage']} / 失败 {stats['modes']['failed']}")
+            
             with st.expander("如何获得更好的结果？"):
                 st.markdown("""
                 1. **上传领域文档**：在"知识库管理"选项卡上传相关PDF
@@ -325,7 +421,7 @@ def main():
             if use_knowledge:
                 with st.spinner("🔍 正在搜索相关知识..."):
                     similar_cases = find_similar_cases(user_input, test_cases_df)
-                    relevant_knowledge = find_relevant_knowledge(user_input, knowledge_df)
+                    relevant_knowledge = find_relevant_knowledge(user_input, selected_namespaces)
                 
                 with st.spinner("🤖 AI正在生成增强测试用例..."):
                     new_cases = generate_test_cases(user_input, similar_cases, relevant_knowledge, use_enhancement=True)
@@ -337,7 +433,7 @@ def main():
                         for i, segment in enumerate(relevant_knowledge):
                             st.markdown(f"""
                             <div style="margin-bottom: 10px; padding: 10px; border-left: 3px solid #3B82F6; background-color: #F3F4F6;">
-                                <p><b>文档：</b>{segment['document']} (第{segment['page']}页)</p>
+                                <p><b>文档：</b>{segment['document']} (第{segment['page']}页，命名空间：{segment['namespace']})</p>
                                 <p>{segment['content']}</p>
                             </div>
                             """, unsafe_allow_html=True)
@@ -360,6 +456,8 @@ def main():
         upload_col1, upload_col2 = st.columns([3, 1])
         
         with upload_col1:
+            upload_namespace = st.text_input("目标命名空间", DEFAULT_NAMESPACE,
+                                             help="按项目或产品线划分知识库，每个命名空间独立存储和检索")
             uploaded_file = st.file_uploader("上传PDF文档（将被分割并存入知识库）", type="pdf")
             
         with upload_col2:
@@ -368,16 +466,32 @@ def main():
                     with st.spinner("正在处理PDF文档..."):
                         segments, segment_count, page_count = process_pdf(uploaded_file)
                         if segments:
-                            total_count = save_knowledge_segments(segments)
-                            st.session_state.knowledge_segments_count = total_count
-                            st.success(f"✅ 文档处理完成！从 {page_count} 页中提取了 {segment_count} 个知识段落。")
-                            knowledge_df = load_knowledge_segments()
+                            total_count = save_knowledge_segments(segments, upload_namespace)
+                            st.success(f"✅ 文档处理完成！从 {page_count} 页中提取了 {segment_count} 个知识段落，"
+                                       f"命名空间[{normalize_namespace(upload_namespace)}]共 {total_count} 个段落。")
+                            namespaces = list_namespaces()
         
-        if not knowledge_df.empty:
+        if namespaces:
             st.markdown("<h3>📚 知识库内容</h3>", unsafe_allow_html=True)
             
+            ns_col1, ns_col2, ns_col3 = st.columns([2, 1, 1])
+            with ns_col1:
+                selected_namespace = st.selectbox("选择命名空间", namespaces)
+            with ns_col2:
+                if st.button("预热索引", use_container_width=True):
+                    try:
+                        warm_knowledge_index([selected_namespace])
+                        st.success(f"已加载命名空间[{selected_namespace}]的检索索引")
+                    except Exception as e:
+                        st.error(f"命名空间[{selected_namespace}]索引构建失败：{str(e)}")
+            with ns_col3:
+                if st.button("释放索引", use_container_width=True):
+                    evict_knowledge_index([selected_namespace])
+                    st.success(f"已从内存释放命名空间[{selected_namespace}]的检索索引")
+            
+            knowledge_df = load_knowledge_segments(selected_namespace)
             docs = knowledge_df['document_name'].unique()
-            st.markdown(f"当前知识库包含 **{len(docs)}** 个文档，共 **{len(knowledge_df)}** 个知识段落。")
+            st.markdown(f"命名空间 **{selected_namespace}** 包含 **{len(docs)}** 个文档，共 **{len(knowledge_df)}** 个知识段落。")
             
             selected_doc = st.selectbox("选择要查看的文档", ["所有文档"] + list(docs))
             
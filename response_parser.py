@@ -0,0 +1,214 @@
+import re
+import json
+import time
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+from json_repair import repair_json
+
+try:
+    import orjson
+    _fast_loads = orjson.loads
+except ImportError:  # orjson不可用时退回标准库
+    _fast_loads = json.loads
+
+CASE_FIELDS = ["用例编号", "步骤", "预期", "优先级"]
+CASE_ID_PREFIX = "TC-"
+CASE_LIST_KEYS = ("test_cases", "cases", "用例", "测试用例")
+
+_THINK_BLOCK = re.compile(r"<think>.*?</think>", re.DOTALL | re.IGNORECASE)
+# 围栏必须独占一行，避免用例内容里的```把JSON截断
+_FENCED_BLOCK = re.compile(r"^[ \t]*```[ \t]*(?:json)?[ \t]*\n(.*?)\n[ \t]*```[ \t]*$",
+                           re.DOTALL | re.IGNORECASE | re.MULTILINE)
+_DECODER = json.JSONDecoder()
+
+
+class ParseStats:
+    """解析耗时与丢弃率统计（进程内累计，线程安全）"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.responses = 0
+            self.modes = {"fast": 0, "repair": 0, "salvage": 0, "failed": 0}
+            self.parse_ms = 0.0
+            self.cases_valid = 0
+            self.cases_rejected = 0
+
+    def record_parse(self, mode: str, elapsed_ms: float):
+        with self._lock:
+            self.responses += 1
+            self.modes[mode] += 1
+            self.parse_ms += elapsed_ms
+
+    def record_validation(self, valid: int, rejected: int):
+        with self._lock:
+            self.cases_valid += valid
+            self.cases_rejected += rejected
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total_cases = self.cases_valid + self.cases_rejected
+            return {
+                "responses": self.responses,
+                "modes": dict(self.modes),
+                "avg_parse_ms": self.parse_ms / self.responses if self.responses else 0.0,
+                "failed_rate": self.modes["failed"] / self.responses if self.responses else 0.0,
+                "cases_valid": self.cases_valid,
+                "cases_rejected": self.cases_rejected,
+                "discard_rate": self.cases_rejected / total_cases if total_cases else 0.0,
+            }
+
+
+PARSE_STATS = ParseStats()          # LLM响应
+HISTORY_PARSE_STATS = ParseStats()  # 历史用例CSV
+
+
+def strip_wrappers(text: str) -> str:
+    """去除R1的<think>推理块和markdown代码围栏"""
+    text = _THINK_BLOCK.sub("", text)
+    if "</think>" in text:  # 部分网关会丢掉起始标签
+        text = text.rsplit("</think>", 1)[1]
+    if "<think>" in text:  # 推理被截断，之后不会有答案
+        text = text.split("<think>", 1)[0]
+
+    fenced = _FENCED_BLOCK.search(text)
+    if fenced:
+        return fenced.group(1).strip()
+    text = text.strip()
+    if text.startswith("```"):  # 未闭合的围栏（输出被截断）
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+    return text.strip()
+
+
+def _json_span(text: str) -> str:
+    """截取首个'['或'{'到最后一个对应闭合符之间的内容，去掉前后的说明文字"""
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    if not starts:
+        return text
+    start = min(starts)
+    end = text.rfind("]" if text[start] == "[" else "}")
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def salvage_objects(text: str) -> List[dict]:
+    """从部分损坏的数组中逐个提取能独立解码的JSON对象"""
+    objects = []
+    pos = text.find("{")
+    while pos != -1:
+        try:
+            obj, end = _DECODER.raw_decode(text, pos)
+        except ValueError:
+            pos = text.find("{", pos + 1)
+            continue
+        if isinstance(obj, dict):
+            objects.append(obj)
+        pos = text.find("{", end)
+    return objects
+
+
+def _object_lists(value: dict) -> List[list]:
+    return [v for v in value.values() if isinstance(v, list) and v and all(isinstance(item, dict) for item in v)]
+
+
+def _coerce(value: Any, expect: type) -> Any:
+    if isinstance(value, expect):
+        return value
+    if expect is list and isinstance(value, dict):
+        # 只返回了单条用例
+        if CASE_FIELDS[0] in value:
+            return [value]
+        # response_format=json_object时模型常把数组包一层对象：{"test_cases": [...], "notes": [...]}
+        for key in CASE_LIST_KEYS:
+            if isinstance(value.get(key), list):
+                return value[key]
+        # 未知键名时优先取包含用例编号的列表，避免误取{"meta": [{...}]}之类的元数据
+        lists = _object_lists(value)
+        for v in lists:
+            if any(CASE_FIELDS[0] in item for item in v):
+                return v
+        if lists:
+            return lists[0]
+    if expect is dict and isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        # 测试套件只返回了用例数组
+        return {"test_cases": value}
+    return None
+
+
+def parse_json(text: Any, expect: type = list, salvage: bool = True, stats: Optional[ParseStats] = PARSE_STATS) -> Any:
+    """快速路径解析LLM/CSV中的结构化输出
+
+    依次尝试：严格解码 -> repair_json修复 -> 逐对象抢救（返回list）。全部失败返回None。
+    能完整解码但结构不符（如网关返回的{"error": ...}）直接记为失败，不做抢救。
+    """
+    start = time.perf_counter()
+    mode, result = "failed", None
+    decoded = False
+    body = strip_wrappers(str(text))
+
+    for candidate in dict.fromkeys((body, _json_span(body))):
+        try:
+            value = _fast_loads(candidate)
+        except ValueError:
+            continue
+        decoded = True
+        result = _coerce(value, expect)
+        if result is not None:
+            mode = "fast"
+            break
+
+    if result is None and not decoded:
+        try:
+            value = repair_json(body, return_objects=True)
+        except Exception:
+            value = None
+        decoded = isinstance(value, (list, dict)) and bool(value)
+        result = _coerce(value, expect) if decoded else None
+        if result is not None:
+            mode = "repair"
+
+    if result is None and salvage and not decoded:
+        objects = salvage_objects(body)
+        if objects:
+            mode, result = "salvage", objects
+
+    if stats is not None:
+        stats.record_parse(mode, (time.perf_counter() - start) * 1000)
+    return result
+
+
+def validate_cases(cases: List[Any], required_fields: List[str] = CASE_FIELDS,
+                   id_field: Optional[str] = "用例编号", id_prefix: Optional[str] = CASE_ID_PREFIX,
+                   stats: Optional[ParseStats] = PARSE_STATS) -> Tuple[List[dict], List[str]]:
+    """按批次校验用例结构，返回(合法用例, 被丢弃用例的原因)"""
+    valid, rejected = [], []
+    for idx, case in enumerate(cases or []):
+        if not isinstance(case, dict):
+            rejected.append(f"第{idx+1}条用例不是JSON对象")
+            continue
+        missing = [field for field in required_fields if field not in case]
+        if missing:
+            rejected.append(f"第{idx+1}条用例字段缺失: {', '.join(missing)}")
+            continue
+        if id_field and id_prefix and not str(case[id_field]).startswith(id_prefix):
+            rejected.append(f"编号格式错误: {case[id_field]}")
+            continue
+        valid.append(case)
+
+    if stats is not None:
+        stats.record_validation(len(valid), len(rejected))
+    return valid, rejected
+
+
+def parse_cases(content: str, min_valid: int = 1, allow_rejected: bool = True) -> Optional[Tuple[List[dict], List[str]]]:
+    """解析并校验一次LLM响应，合法用例少于min_valid或不允许丢弃时有不合规用例则返回None（可作为模型路由的校验函数）"""
+    cases, rejected = validate_cases(parse_json(content) or [])
+    if len(cases) < max(min_valid, 1) or (rejected and not allow_rejected):
+        return None
+    return cases, rejected
+
+
+def strict_case_validator(min_valid: int) -> Callable[[str], Optional[Tuple[List[dict], List[str]]]]:
+    """快速模型的校验：用例数量不足或有任何不合规用例都视为失败，交给推理模型重试"""
+    return lambda content: parse_cases(content, min_valid=min_valid, allow_rejected=False)
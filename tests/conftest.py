@@ -0,0 +1,32 @@
+import functools
+import os
+import sys
+import types
+
+# 脚本均位于仓库根目录，测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _cache(func):
+    # 与st.cache_data/st.cache_resource一致：按参数缓存，支持clear()
+    cached = functools.lru_cache(maxsize=None)(func)
+    cached.clear = cached.cache_clear
+    return cached
+
+
+def _stub_streamlit():
+    """脚本在导入时就用到streamlit的缓存装饰器，测试中用桩模块代替并记录提示信息"""
+    st = types.ModuleType("streamlit")
+    st.messages = []
+    st.cache_data = _cache
+    st.cache_resource = _cache
+
+    def recorder(level):
+        return lambda text, *args, **kwargs: st.messages.append((level, text))
+
+    for level in ("error", "warning", "info", "success"):
+        setattr(st, level, recorder(level))
+    return st
+
+
+sys.modules["streamlit"] = _stub_streamlit()
@@ -0,0 +1,26 @@
+import json
+import os
+import pandas as pd
+import rag_test_gen
+from response_parser import HISTORY_PARSE_STATS
+
+CASES = [{"用例编号": "TC-A-01", "步骤": "打开页面", "预期": "页面正常", "优先级": 1}]
+
+
+def write_history(path, rows):
+    pd.DataFrame(rows, columns=["需求描述", "测试用例"]).to_csv(path, index=False)
+
+
+def test_load_cases_parses_once_per_file_version(tmp_path):
+    csv_path = str(tmp_path / "test_cases.csv")
+    write_history(csv_path, [["登录", json.dumps(CASES, ensure_ascii=False)], ["注册", "不是JSON"]])
+
+    for _ in range(3):  # 模拟多次rerun
+        df = rag_test_gen.load_cases(csv_path)
+    assert df["测试用例"].tolist() == [CASES, []]
+    assert HISTORY_PARSE_STATS.snapshot()["responses"] == 2
+
+    write_history(csv_path, [["登录", json.dumps(CASES, ensure_ascii=False)]])
+    os.utime(csv_path, (0, os.path.getmtime(csv_path) + 10))
+    assert rag_test_gen.load_cases(csv_path)["测试用例"].tolist() == [CASES]
+    assert HISTORY_PARSE_STATS.snapshot()["responses"] == 1
@@ -0,0 +1,98 @@
+import os
+import pandas as pd
+import pytest
+import streamlit as st
+import rag_test_gen as rag
+
+
+@pytest.fixture(autouse=True)
+def knowledge_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag, "KNOWLEDGE_DIR", str(tmp_path / "knowledge_base"))
+    monkeypatch.setattr(rag, "LEGACY_KNOWLEDGE_CSV", str(tmp_path / "knowledge_segments.csv"))
+    rag.evict_knowledge_index()
+    st.messages.clear()
+    yield tmp_path
+    rag.evict_knowledge_index()
+
+
+def segments(*contents, document="spec.pdf"):
+    return [{"segment_id": f"{document}_{i}", "document_name": document, "page_num": 1, "content": content}
+            for i, content in enumerate(contents)]
+
+
+def test_normalize_namespace_and_path():
+    assert rag.normalize_namespace(" shop/cart v2 ") == "shop_cart_v2"
+    assert rag.normalize_namespace("支付-核心") == "支付-核心"
+    assert rag.normalize_namespace("") == rag.DEFAULT_NAMESPACE
+    assert rag.normalize_namespace("../") == rag.DEFAULT_NAMESPACE
+    assert rag.namespace_path("../etc") == os.path.join(rag.KNOWLEDGE_DIR, "etc.csv")
+
+
+def test_migrate_legacy_knowledge():
+    pd.DataFrame(segments("legacy login lockout rules")).to_csv(rag.LEGACY_KNOWLEDGE_CSV, index=False)
+    rag.migrate_legacy_knowledge()
+    assert not os.path.exists(rag.LEGACY_KNOWLEDGE_CSV)
+    assert rag.list_namespaces() == [rag.DEFAULT_NAMESPACE]
+    assert rag.load_knowledge_segments(rag.DEFAULT_NAMESPACE)["content"].tolist() == ["legacy login lockout rules"]
+
+
+def test_migrate_keeps_existing_default_shard():
+    rag.save_knowledge_segments(segments("current shard"))
+    pd.DataFrame(segments("legacy shard")).to_csv(rag.LEGACY_KNOWLEDGE_CSV, index=False)
+    rag.migrate_legacy_knowledge()
+    assert os.path.exists(rag.LEGACY_KNOWLEDGE_CSV)
+    assert rag.load_knowledge_segments(rag.DEFAULT_NAMESPACE)["content"].tolist() == ["current shard"]
+
+
+def test_index_rebuilds_on_mtime_change_and_evicts():
+    rag.save_knowledge_segments(segments("cart checkout discount"), "shop")
+    first = rag.build_knowledge_index("shop")
+    assert rag.build_knowledge_index("shop") is first
+    assert rag.loaded_namespaces() == ["shop"]
+
+    path = rag.namespace_path("shop")
+    pd.DataFrame(segments("cart checkout discount", "inventory shortage warning")).to_csv(path, index=False)
+    os.utime(path, (0, first["mtime"] + 10))
+    second = rag.build_knowledge_index("shop")
+    assert second is not first
+    assert len(second["df"]) == 2
+
+    rag.evict_knowledge_index(["shop"])
+    assert rag.loaded_namespaces() == []
+
+
+def test_save_evicts_stale_index():
+    rag.save_knowledge_segments(segments("cart checkout discount"), "shop")
+    rag.warm_knowledge_index(["shop"])
+    rag.save_knowledge_segments(segments("inventory shortage warning", document="more.pdf"), "shop")
+    assert rag.loaded_namespaces() == []
+
+
+def test_search_only_selected_namespaces():
+    rag.save_knowledge_segments(segments("login password lockout after failures"), "auth")
+    rag.save_knowledge_segments(segments("login banner for the shop homepage"), "shop")
+    results = rag.find_relevant_knowledge("login lockout", ["auth"])
+    assert [item["namespace"] for item in results] == ["auth"]
+    assert rag.loaded_namespaces() == ["auth"]
+
+
+def test_search_skips_unrelated_segments():
+    rag.save_knowledge_segments(segments("login password lockout after failures"), "auth")
+    rag.save_knowledge_segments(segments("cart checkout discount", "inventory shortage warning"), "shop")
+    results = rag.find_relevant_knowledge("login lockout", ["auth", "shop"], top_k=3)
+    assert [item["namespace"] for item in results] == ["auth"]
+
+
+@pytest.mark.parametrize("broken", [
+    pd.DataFrame({"segment_id": ["x"], "document_name": ["x.pdf"], "page_num": [1]}),  # 缺少content列
+    pd.DataFrame(segments("! ?")),  # TF-IDF空词表
+])
+def test_broken_shard_is_isolated(broken):
+    rag.save_knowledge_segments(segments("login password lockout after failures"), "auth")
+    os.makedirs(rag.KNOWLEDGE_DIR, exist_ok=True)
+    broken.to_csv(rag.namespace_path("broken"), index=False)
+
+    results = rag.find_relevant_knowledge("login lockout", ["broken", "auth"])
+    assert [item["namespace"] for item in results] == ["auth"]
+    assert [level for level, _ in st.messages] == ["error"]
+    assert "broken" in st.messages[0][1]
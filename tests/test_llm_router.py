@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from llm_router import LLMRouter
+from response_parser import parse_cases, strict_case_validator
+
+VALID = json.dumps([{"用例编号": "TC-A-01", "步骤": "打开页面", "预期": "页面正常", "优先级": 1},
+                    {"用例编号": "TC-A-02", "步骤": "刷新页面", "预期": "页面正常", "优先级": 2}],
+                   ensure_ascii=False)
+
+
+class StubServer:
+    """本地OpenAI兼容接口桩：按模型名依次取出预设的(状态码, 延迟秒数, 内容)"""
+    def __init__(self):
+        self.scripts = {}
+        self.calls = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.calls.append((self.path, body["model"]))
+                    script = stub.scripts[body["model"]]
+                    status, delay, content = script.pop(0) if len(script) > 1 else script[0]
+                time.sleep(delay)
+                data = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def models(self):
+        return [model for _, model in self.calls]
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def make_router(stub, **kwargs):
+    options = {"fast_model": "fast", "reasoning_model": "r1"}
+    options.update(kwargs)
+    return LLMRouter(api_url=stub.url, api_key="test", **options)
+
+
+def test_fast_model_invalid_falls_back_to_r1(stub):
+    stub.scripts = {"fast": [(200, 0, "不是JSON")], "r1": [(200, 0, VALID)]}
+    router = make_router(stub)
+    cases, rejected = router.complete("sys", "登录功能", validate=parse_cases)
+    assert len(cases) == 2 and rejected == []
+    assert stub.models() == ["fast", "r1"]
+    assert stub.calls[0][0] == "/v1/chat/completions"
+    assert router.snapshot()["fast"]["invalid"] == 1
+
+
+def test_fast_model_too_few_cases_falls_back_to_r1(stub):
+    one_case = json.dumps(json.loads(VALID)[:1], ensure_ascii=False)
+    stub.scripts = {"fast": [(200, 0, one_case)], "r1": [(200, 0, VALID)]}
+    router = make_router(stub)
+    cases, _ = router.complete("sys", "登录功能", validate=parse_cases, fast_validate=strict_case_validator(2))
+    assert len(cases) == 2
+    assert stub.models() == ["fast", "r1"]
+
+
+def test_fast_model_error_falls_back_to_r1(stub):
+    stub.scripts = {"fast": [(500, 0, "")], "r1": [(200, 0, VALID)]}
+    router = make_router(stub)
+    cases, _ = router.complete("sys", "登录功能", validate=parse_cases)
+    assert len(cases) == 2
+    assert router.snapshot()["fast"]["errors"] == 1
+
+
+def test_long_prompt_skips_fast_model(stub):
+    stub.scripts = {"r1": [(200, 0, VALID)]}
+    router = make_router(stub)
+    router.complete("sys", "需求" * 200, validate=parse_cases)
+    assert stub.models() == ["r1"]
+
+
+def test_hedge_fires_after_p90_and_first_valid_wins(stub):
+    stub.scripts = {"r1": [(200, 2, VALID), (200, 0, VALID)]}
+    router = make_router(stub, fast_model="")
+    for _ in range(5):
+        router.model_stats("r1").record(50)
+    start = time.perf_counter()
+    cases, _ = router.complete("sys", "登录功能", validate=parse_cases)
+    assert time.perf_counter() - start < 1
+    assert len(cases) == 2
+    assert stub.models() == ["r1", "r1"]
+    assert router.snapshot()["r1"]["hedges"] == 1
+
+
+def test_hedge_skipped_when_cap_reached(stub):
+    stub.scripts = {"r1": [(200, 0.3, VALID)]}
+    router = make_router(stub, fast_model="", max_hedges_per_model=0)
+    for _ in range(5):
+        router.model_stats("r1").record(50)
+    router.complete("sys", "登录功能", validate=parse_cases)
+    assert stub.models() == ["r1"]
+    assert router.snapshot()["r1"]["hedges"] == 0
+
+
+def test_errors_propagate(stub):
+    stub.scripts = {"fast": [(500, 0, "")], "r1": [(503, 0, "")]}
+    router = make_router(stub)
+    with pytest.raises(requests.HTTPError):
+        router.complete("sys", "登录功能", validate=parse_cases)
+    snapshot = router.snapshot()
+    assert snapshot["r1"]["error_rate"] == 1.0
+
+
+def test_all_invalid_returns_none(stub):
+    stub.scripts = {"fast": [(200, 0, "[]")], "r1": [(200, 0, "[]")]}
+    router = make_router(stub)
+    assert router.complete("sys", "登录功能", validate=parse_cases) is None
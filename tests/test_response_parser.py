@@ -0,0 +1,105 @@
+import json
+import pytest
+from response_parser import ParseStats, parse_cases, parse_json, strip_wrappers, validate_cases
+
+
+def case(idx, **overrides):
+    data = {"用例编号": f"TC-A-{idx:02d}", "步骤": "打开页面", "预期": "页面正常", "优先级": 1}
+    data.update(overrides)
+    return data
+
+
+CASES = [case(1), case(2)]
+CASES_JSON = json.dumps(CASES, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("text, expected, mode", [
+    (CASES_JSON, CASES, "fast"),
+    (f"<think>先想想 [1, 2]</think>\n{CASES_JSON}", CASES, "fast"),
+    (f"推理过程</think>{CASES_JSON}", CASES, "fast"),
+    (f"好的，结果如下：\n```json\n{CASES_JSON}\n```\n以上。", CASES, "fast"),
+    (f"以下是用例 {CASES_JSON} 请查收", CASES, "fast"),
+    (json.dumps({"test_cases": CASES, "notes": ["x"]}, ensure_ascii=False), CASES, "fast"),
+    (json.dumps({"summary": ["x"], "items": CASES}, ensure_ascii=False), CASES, "fast"),
+    (json.dumps({"meta": [{"a": 1}], "items": CASES}, ensure_ascii=False), CASES, "fast"),
+    (json.dumps(case(1), ensure_ascii=False), [case(1)], "fast"),
+    ("[{'用例编号': 'TC-A-01', '步骤': '打开页面', '预期': '页面正常', '优先级': 1}]", [case(1)], "repair"),
+    (CASES_JSON[:-1], CASES, "repair"),
+    ("说明文字，没有任何JSON", None, "failed"),
+    ('{"error": "rate limited"}', None, "failed"),
+    ("<think>推理被截断", None, "failed"),
+])
+def test_parse_json_modes(text, expected, mode):
+    stats = ParseStats()
+    assert parse_json(text, stats=stats) == expected
+    assert stats.snapshot()["modes"][mode] == 1
+
+
+def test_fence_ignores_inline_backticks():
+    cases = [case(1, 步骤="run ```ls```"), case(2)]
+    text = "```json\n" + json.dumps(cases, ensure_ascii=False) + "\n```"
+    stats = ParseStats()
+    assert parse_json(text, stats=stats) == cases
+    assert stats.snapshot()["modes"]["fast"] == 1
+
+
+def test_unterminated_fence():
+    assert strip_wrappers(f"```json\n{CASES_JSON}") == CASES_JSON
+
+
+def test_salvage_keeps_decodable_objects(monkeypatch):
+    # 修复失败时才走抢救路径
+    monkeypatch.setattr("response_parser.repair_json", lambda *args, **kwargs: "")
+    text = "[" + json.dumps(case(1), ensure_ascii=False) + ', {"用例编号": "TC-A-02" "步骤": }, ' \
+           + json.dumps(case(3), ensure_ascii=False)
+    stats = ParseStats()
+    assert parse_json(text, stats=stats) == [case(1), case(3)]
+    assert stats.snapshot()["modes"]["salvage"] == 1
+
+
+def test_parse_json_expect_dict():
+    suite = {"openapi": "3.0.0", "test_cases": []}
+    assert parse_json(json.dumps(suite), expect=dict, stats=None) == suite
+
+
+def test_parse_json_expect_dict_accepts_bare_array():
+    tests = [{"name": "查询", "method": "GET", "path": "/api", "assertions": []}]
+    stats = ParseStats()
+    assert parse_json(json.dumps(tests), expect=dict, stats=stats) == {"test_cases": tests}
+    assert stats.snapshot()["modes"]["fast"] == 1
+
+
+def test_validate_cases():
+    stats = ParseStats()
+    valid, rejected = validate_cases(
+        [case(1), "文本", {"用例编号": "TC-A-03"}, case(4, 用例编号="A-04")], stats=stats)
+    assert valid == [case(1)]
+    assert rejected == [
+        "第2条用例不是JSON对象",
+        "第3条用例字段缺失: 步骤, 预期, 优先级",
+        "编号格式错误: A-04",
+    ]
+    snapshot = stats.snapshot()
+    assert (snapshot["cases_valid"], snapshot["cases_rejected"]) == (1, 3)
+    assert snapshot["discard_rate"] == 0.75
+
+
+def test_validate_cases_without_id_check():
+    valid, rejected = validate_cases([{"name": "a"}, {}], ["name"], id_field=None, stats=None)
+    assert valid == [{"name": "a"}]
+    assert rejected == ["第2条用例字段缺失: name"]
+
+
+def test_parse_cases():
+    wrapped = json.dumps({"cases": CASES, "notes": ["x"]}, ensure_ascii=False)
+    assert parse_cases(wrapped) == (CASES, [])
+    assert parse_cases("[]") is None
+
+
+def test_parse_stats_rates():
+    stats = ParseStats()
+    stats.record_parse("fast", 1.0)
+    stats.record_parse("failed", 3.0)
+    snapshot = stats.snapshot()
+    assert snapshot["avg_parse_ms"] == 2.0
+    assert snapshot["failed_rate"] == 0.5